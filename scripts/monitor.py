@@ -4,15 +4,60 @@ Sysdig Documentation Monitor
 Monitors Sysdig documentation for updates and generates Japanese reports
 """
 
+import asyncio
+import httpx
 import feedparser
-import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from selectolax.lexbor import LexborHTMLParser
 from datetime import datetime, timedelta
-import json
+import orjson
 import hashlib
+import os
 from pathlib import Path
-from typing import Dict, List, Any
-import time
+from typing import Dict, List, Any, Tuple
+import zstandard as zstd
+
+# Append-only log of change snapshots, one zstd frame per JSON line
+HISTORY_FILENAME = "history.jsonl.zst"
+ZSTD_FRAME_MAGIC = b"\x28\xb5\x2f\xfd"
+
+def append_history(filepath: Path, record: Dict[str, Any]):
+    """Append a record to a zstd-compressed JSONL log"""
+    cctx = zstd.ZstdCompressor(level=3, write_checksum=True)
+    with open(filepath, 'ab') as f:
+        with cctx.stream_writer(f, closefd=False) as writer:
+            writer.write(orjson.dumps(record) + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def read_last_history_record(filepath: Path) -> Dict[str, Any]:
+    """Return the newest intact record of a zstd-compressed JSONL log"""
+    if not filepath.exists():
+        return {}
+
+    data = filepath.read_bytes()
+    last_record = {}
+    pos = 0
+    # Decode frame by frame so a damaged frame (e.g. an append cut short) is skipped
+    # and the frames before and after it stay readable
+    while pos < len(data):
+        dobj = zstd.ZstdDecompressor().decompressobj()
+        try:
+            output = dobj.decompress(data[pos:])
+            if not dobj.eof:
+                raise zstd.ZstdError("incomplete frame")
+            lines = [line for line in output.split(b"\n") if line]
+            if lines:
+                last_record = orjson.loads(lines[-1])
+            pos = len(data) - len(dobj.unused_data)
+        except (zstd.ZstdError, orjson.JSONDecodeError) as e:
+            print(f"Warning: skipping damaged frame at byte {pos} of {filepath}: {e}")
+            next_frame = data.find(ZSTD_FRAME_MAGIC, pos + 1)
+            if next_frame == -1:
+                break
+            pos = next_frame
+
+    return last_record
 
 class SysdigMonitor:
     def __init__(self, data_dir: str = "data", reports_dir: str = "reports"):
@@ -35,89 +80,210 @@ class SysdigMonitor:
             "deprecation": "https://docs.sysdig.com/en/deprecation/"
         }
 
-    def fetch_rss_feed(self, feed_name: str, feed_url: str) -> List[Dict[str, Any]]:
+        self.headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        }
+
+        # Feed parsing is CPU-bound; keep it off the event loop
+        self.parse_executor = ThreadPoolExecutor(max_workers=4)
+
+    def _conditional_headers(self, validators: Dict[str, str]) -> Dict[str, str]:
+        """Build conditional GET headers from previously seen validators"""
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def _response_validators(self, response: httpx.Response) -> Dict[str, str]:
+        """Extract cache validators from a response"""
+        return {
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", "")
+        }
+
+    async def fetch_rss_feed(self, client: httpx.AsyncClient, feed_name: str, feed_url: str,
+                             previous: List[Dict[str, Any]] = None,
+                             validators: Dict[str, str] = None) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
         """Fetch and parse RSS feed"""
         print(f"Fetching RSS feed: {feed_name}")
+        # Only send validators when there is a previous result to fall back on
+        validators = (validators or {}) if previous is not None else {}
         try:
-            feed = feedparser.parse(feed_url)
+            response = await client.get(feed_url, headers=self._conditional_headers(validators))
+            if response.status_code == 304:
+                print(f"RSS feed not modified: {feed_name}")
+                return previous, validators
+
+            response.raise_for_status()
+            validators = self._response_validators(response)
+            body = response.content
+
+            loop = asyncio.get_running_loop()
+            feed = await loop.run_in_executor(self.parse_executor, feedparser.parse, body)
             entries = []
 
             for entry in feed.entries[:5]:  # Get latest 5 entries
                 entries.append({
+                    # guid is stable across title edits; title is the last resort so ID-less entries stay distinct
+                    "id": entry.get("id") or entry.get("link") or entry.get("title", ""),
                     "title": entry.get("title", ""),
                     "link": entry.get("link", ""),
                     "published": entry.get("published", ""),
                     "summary": entry.get("summary", "")[:500]  # First 500 chars
                 })
 
-            return entries
+            return entries, validators
         except Exception as e:
             print(f"Error fetching RSS feed {feed_name}: {e}")
-            return []
+            return [], {}
 
-    def fetch_web_page(self, page_name: str, url: str) -> Dict[str, Any]:
+    async def fetch_web_page(self, client: httpx.AsyncClient, page_name: str, url: str,
+                             previous: Dict[str, Any] = None,
+                             validators: Dict[str, str] = None) -> Tuple[Dict[str, Any], Dict[str, str]]:
         """Fetch and parse web page"""
         print(f"Fetching web page: {page_name}")
+        previous = previous or {}
+        # Only send validators when there is a previous result to fall back on
+        validators = (validators or {}) if "content_hash" in previous else {}
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
+            async with client.stream("GET", url, headers=self._conditional_headers(validators)) as response:
+                if response.status_code == 304:
+                    print(f"Web page not modified: {page_name}")
+                    return {**previous, "fetched_at": datetime.now().isoformat()}, validators
+
+                response.raise_for_status()
+                new_validators = self._response_validators(response)
+
+                # Server ignored the conditional headers but validators still match.
+                # ETag takes precedence; Last-Modified only counts when neither side has one.
+                if new_validators["etag"] or validators.get("etag"):
+                    unchanged = new_validators["etag"] == validators.get("etag")
+                else:
+                    unchanged = bool(new_validators["last_modified"]) and \
+                        new_validators["last_modified"] == validators.get("last_modified")
+                if validators and unchanged:
+                    print(f"Web page unchanged (validators match): {page_name}")
+                    return {**previous, "fetched_at": datetime.now().isoformat()}, new_validators
 
-            soup = BeautifulSoup(response.text, 'html.parser')
+                await response.aread()
+                html = response.text
+
+            tree = LexborHTMLParser(html)
+            tree.strip_tags(['script', 'style'])
 
             # Extract main content
-            content = soup.find('article') or soup.find('main') or soup.find('div', class_='content')
+            content = tree.css_first('article') or tree.css_first('main') or tree.css_first('div.content')
 
             if content:
-                # Get text content
-                text = content.get_text(separator='\n', strip=True)
-
-                # Calculate hash for change detection
-                content_hash = hashlib.sha256(text.encode()).hexdigest()
-
-                # Extract headings for structure
+                # Single walk: collect headings, hash every text fragment, and keep only the preview text
+                hasher = hashlib.sha256()
                 headings = []
-                for heading in content.find_all(['h1', 'h2', 'h3'])[:10]:
-                    headings.append({
-                        "level": heading.name,
-                        "text": heading.get_text(strip=True)
-                    })
+                preview = []
+                preview_len = 0
+                for node in content.traverse(include_text=True):
+                    if node.tag in ('h1', 'h2', 'h3') and len(headings) < 10:
+                        headings.append({
+                            "level": node.tag,
+                            "text": node.text(deep=True, strip=True)
+                        })
+                    if node.tag != '-text':
+                        continue
+                    fragment = node.text_content.strip()
+                    if not fragment:
+                        continue
+                    if preview_len:
+                        hasher.update(b'\n')
+                    hasher.update(fragment.encode('utf-8', 'ignore'))
+                    # The joined preview is preview_len - 1 chars long; keep going until it covers 1000
+                    if preview_len - 1 < 1000:
+                        preview.append(fragment)
+                        preview_len += len(fragment) + 1
 
                 return {
                     "url": url,
                     "fetched_at": datetime.now().isoformat(),
-                    "content_hash": content_hash,
+                    "content_hash": hasher.hexdigest(),
                     "headings": headings,
-                    "text_preview": text[:1000]  # First 1000 chars
-                }
+                    "text_preview": '\n'.join(preview)[:1000]  # First 1000 chars
+                }, new_validators
             else:
                 return {
                     "url": url,
                     "error": "Could not find main content"
-                }
+                }, {}
 
         except Exception as e:
             print(f"Error fetching web page {page_name}: {e}")
             return {
                 "url": url,
                 "error": str(e)
-            }
+            }, {}
+
+    async def _fetch_all(self, previous: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Fetch all RSS feeds and web pages concurrently"""
+        # Cap in-flight requests; every source is served from docs.sysdig.com
+        semaphore = asyncio.Semaphore(8)
+
+        async def bounded(coro):
+            async with semaphore:
+                return await coro
+
+        previous_validators = previous.get("validators", {})
+
+        # One pooled HTTP/2 client so every docs.sysdig.com request shares a connection
+        limits = httpx.Limits(max_connections=10, max_keepalive_connections=10)
+        async with httpx.AsyncClient(http2=True, limits=limits, headers=self.headers,
+                                     timeout=30, follow_redirects=True) as client:
+            jobs = [
+                ("rss_feeds", feed_name, feed_url, self.fetch_rss_feed(
+                    client, feed_name, feed_url,
+                    previous.get("rss_feeds", {}).get(feed_name),
+                    previous_validators.get(feed_url)
+                ))
+                for feed_name, feed_url in self.rss_feeds.items()
+            ] + [
+                ("web_pages", page_name, url, self.fetch_web_page(
+                    client, page_name, url,
+                    previous.get("web_pages", {}).get(page_name),
+                    previous_validators.get(url)
+                ))
+                for page_name, url in self.web_urls.items()
+            ]
+            results = await asyncio.gather(*(bounded(coro) for _, _, _, coro in jobs))
+
+        fetched = {"rss_feeds": {}, "web_pages": {}, "validators": {}}
+        for (kind, name, url, _), (result, validators) in zip(jobs, results):
+            fetched[kind][name] = result
+            if validators:
+                fetched["validators"][url] = validators
+
+        return fetched
 
     def load_previous_data(self, filename: str) -> Dict[str, Any]:
         """Load previous monitoring data"""
         filepath = self.data_dir / filename
         if filepath.exists():
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return orjson.loads(filepath.read_bytes())
         return {}
 
     def save_current_data(self, filename: str, data: Dict[str, Any]):
         """Save current monitoring data"""
         filepath = self.data_dir / filename
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+        # Leave the file (and its mtime) untouched when the content is identical
+        if filepath.exists() and filepath.stat().st_size == len(payload) and filepath.read_bytes() == payload:
+            return
+
+        # Write to a temp file and swap it in so an interrupted run never leaves a truncated file
+        tmp_path = filepath.with_suffix(filepath.suffix + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
 
     def detect_changes(self, previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
         """Detect changes between previous and current data"""
@@ -137,14 +303,22 @@ class SysdigMonitor:
                     }
                     changes["has_changes"] = True
                 else:
-                    prev_titles = {e["title"] for e in previous["rss_feeds"][feed_name]}
-                    curr_titles = {e["title"] for e in entries}
-                    new_titles = curr_titles - prev_titles
+                    prev_index = previous.get("rss_index", {}).get(feed_name)
+                    curr_index = current.get("rss_index", {}).get(feed_name)
+                    if prev_index is not None and curr_index is not None:
+                        new_titles = [title for entry_id, title in curr_index.items() if entry_id not in prev_index]
+                    else:
+                        prev_entries = previous["rss_feeds"][feed_name]
+                        # Entries saved before IDs were recorded can only be matched by link
+                        id_key = "id" if all("id" in e for e in prev_entries) else "link"
+                        # Entries without a guid or link fall back to their title
+                        prev_ids = frozenset(e.get(id_key) or e["title"] for e in prev_entries)
+                        new_titles = [e["title"] for e in entries if (e.get(id_key) or e["title"]) not in prev_ids]
 
                     if new_titles:
                         changes["rss_changes"][feed_name] = {
                             "status": "updated",
-                            "new_entries": list(new_titles)
+                            "new_entries": new_titles
                         }
                         changes["has_changes"] = True
 
@@ -179,32 +353,29 @@ class SysdigMonitor:
             "web_pages": {}
         }
 
-        # Fetch RSS feeds
-        print("\n[1/2] Fetching RSS Feeds...")
-        for feed_name, feed_url in self.rss_feeds.items():
-            entries = self.fetch_rss_feed(feed_name, feed_url)
-            current_data["rss_feeds"][feed_name] = entries
-            time.sleep(1)  # Be nice to the server
-
-        # Fetch web pages
-        print("\n[2/2] Fetching Web Pages...")
-        for page_name, url in self.web_urls.items():
-            page_data = self.fetch_web_page(page_name, url)
-            current_data["web_pages"][page_name] = page_data
-            time.sleep(1)  # Be nice to the server
-
-        # Load previous data and detect changes
-        print("\n[3/3] Detecting Changes...")
         previous_data = self.load_previous_data("latest.json")
+
+        # Fetch RSS feeds and web pages
+        print("\n[1/2] Fetching RSS Feeds and Web Pages...")
+        current_data.update(asyncio.run(self._fetch_all(previous_data)))
+
+        # Index entry IDs once so the next run diffs against dict lookups
+        # (entries reused from older data may have an empty ID, so fall back to the title)
+        current_data["rss_index"] = {
+            feed_name: {e["id"] or e["title"]: e["title"] for e in entries}
+            for feed_name, entries in current_data["rss_feeds"].items()
+        }
+
+        # Detect changes against previous data
+        print("\n[2/2] Detecting Changes...")
         changes = self.detect_changes(previous_data, current_data)
 
         # Save current data
         self.save_current_data("latest.json", current_data)
 
-        # Save changes if any
+        # Log changes if any
         if changes["has_changes"]:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.save_current_data(f"changes_{timestamp}.json", {
+            append_history(self.data_dir / HISTORY_FILENAME, {
                 "timestamp": current_data["timestamp"],
                 "changes": changes,
                 "data": current_data
@@ -5,29 +5,15 @@ Analyzes Sysdig documentation changes and generates customer-ready reports in Ja
 """
 
 import anthropic
+import asyncio
 import os
-import json
+import orjson
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Any
+from monitor import HISTORY_FILENAME, read_last_history_record
 
-class JapaneseReportGenerator:
-    def __init__(self, api_key: str = None, reports_dir: str = "reports"):
-        self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
-        if not self.api_key:
-            raise ValueError("ANTHROPIC_API_KEY environment variable is required")
-
-        self.client = anthropic.Anthropic(api_key=self.api_key)
-        self.reports_dir = Path(reports_dir)
-        self.reports_dir.mkdir(exist_ok=True)
-
-    def analyze_with_claude(self, content: str, content_type: str) -> str:
-        """Analyze content using Claude API and generate Japanese summary"""
-
-        system_prompt = """あなたはSysdig製品の技術ドキュメント専門家です。
-お客様向けの分かりやすい日本語レポートを作成してください。
-
-以下の観点で分析してください:
+ANALYSIS_GUIDELINES = """以下の観点で分析してください:
 1. 重要度（Critical/High/Medium/Low）を判定
 2. 技術的な内容を分かりやすく要約
 3. お客様への影響を説明
@@ -52,6 +38,53 @@ class JapaneseReportGenerator:
 ---
 """
 
+ANALYSIS_SYSTEM_PROMPT = """あなたはSysdig製品の技術ドキュメント専門家です。
+お客様向けの分かりやすい日本語レポートを作成してください。
+
+""" + ANALYSIS_GUIDELINES
+
+# The batched call must answer in JSON, so the Markdown format applies to each section value only
+BATCH_SYSTEM_PROMPT = """あなたはSysdig製品の技術ドキュメント専門家です。
+お客様向けの分かりやすい日本語レポートを作成してください。
+
+回答は指定されたJSONオブジェクトのみとしてください（コードブロックや前後の説明文は不要です）。
+JSON内の rss / web の各値は、次の観点と出力形式に従ったMarkdown文字列にしてください。
+
+""" + ANALYSIS_GUIDELINES
+
+# Upper bound for a single batched response
+BATCH_MAX_TOKENS = 16384
+
+class JapaneseReportGenerator:
+    def __init__(self, api_key: str = None, reports_dir: str = "reports"):
+        self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+        if not self.api_key:
+            raise ValueError("ANTHROPIC_API_KEY environment variable is required")
+
+        self.client = anthropic.AsyncAnthropic(api_key=self.api_key)
+        self.reports_dir = Path(reports_dir)
+        self.reports_dir.mkdir(exist_ok=True)
+
+    async def stream_claude(self, user_prompt: str, max_tokens: int,
+                            system: str = ANALYSIS_SYSTEM_PROMPT) -> str:
+        """Stream a Claude response and return the accumulated text"""
+        chunks = []
+        async with self.client.messages.stream(
+            model="claude-sonnet-4-5-20250929",
+            max_tokens=max_tokens,
+            temperature=0,
+            system=system,
+            messages=[
+                {"role": "user", "content": user_prompt}
+            ]
+        ) as stream:
+            async for text in stream.text_stream:
+                chunks.append(text)
+
+        return "".join(chunks)
+
+    async def analyze_with_claude(self, content: str, content_type: str) -> str:
+        """Analyze content using Claude API and generate Japanese summary"""
         user_prompt = f"""以下の{content_type}を分析して、お客様向けの日本語レポートを作成してください。
 
 内容:
@@ -62,27 +95,80 @@ class JapaneseReportGenerator:
 """
 
         try:
-            message = self.client.messages.create(
-                model="claude-sonnet-4-5-20250929",
-                max_tokens=4096,
-                temperature=0,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
-
-            return message.content[0].text
+            return await self.stream_claude(user_prompt, max_tokens=4096)
 
         except Exception as e:
             print(f"Error calling Claude API: {e}")
             return f"**エラー:** Claude APIの呼び出しに失敗しました: {str(e)}"
 
-    def generate_rss_analysis(self, feed_name: str, entries: List[Dict[str, Any]]) -> str:
-        """Generate analysis for RSS feed entries"""
-        if not entries:
-            return ""
+    async def analyze_batch_with_claude(self, summary_content: Dict[str, Any],
+                                        rss_sections: Dict[str, str],
+                                        web_sections: Dict[str, str]) -> Dict[str, Any]:
+        """Analyze the executive summary and every changed section in a single Claude API call"""
+        sections = ""
+        for feed_name, content in rss_sections.items():
+            sections += f"=== rss: {feed_name} ===\n{content}\n"
+        for page_name, content in web_sections.items():
+            sections += f"=== web: {page_name} ===\n{content}\n"
+
+        user_prompt = f"""以下の監視結果と各セクションの内容を分析して、お客様向けの日本語レポートを作成してください。
+
+監視結果:
+{orjson.dumps(summary_content, option=orjson.OPT_INDENT_2).decode()}
+
+{sections}
+次のJSON形式のみで回答してください（コードブロックや説明文は不要です）:
+{{"executive": "エグゼクティブサマリー", "rss": {{"フィード名": "分析結果"}}, "web": {{"ページ名": "分析結果"}}}}
+
+- executive: 監視結果のエグゼクティブサマリーを3-5文で作成してください。変更があった場合は特に注意を促し、変更がない場合は安定稼働中であることを伝えてください。
+- rss / web: 「=== rss: 名前 ===」「=== web: 名前 ===」の各セクションを、名前をキーとして指定の出力形式（Markdown）で分析してください。
+- 専門用語は必要に応じて日本語訳の後にカッコ書きで英語を併記してください。
+- セキュリティやEOL（サポート終了）に関する情報は特に重要度を高く評価してください。
+"""
 
+        try:
+            text = (await self.stream_claude(
+                user_prompt,
+                max_tokens=min(512 + 4096 * (len(rss_sections) + len(web_sections)), BATCH_MAX_TOKENS),
+                system=BATCH_SYSTEM_PROMPT
+            )).strip()
+            if text.startswith("```"):
+                text = text.split("\n", 1)[1].rsplit("```", 1)[0]
+
+            analysis = orjson.loads(text)
+
+        except Exception as e:
+            print(f"Error in batched Claude analysis, falling back to per-section calls: {e}")
+            analysis = {}
+
+        # Keep only well-formed string values; anything else falls through to the per-section calls
+        if not isinstance(analysis, dict):
+            analysis = {}
+        executive = analysis.get("executive")
+        rss = analysis.get("rss")
+        web = analysis.get("web")
+        return {
+            "executive": executive if isinstance(executive, str) else "",
+            "rss": {k: v for k, v in rss.items() if isinstance(v, str)} if isinstance(rss, dict) else {},
+            "web": {k: v for k, v in web.items() if isinstance(v, str)} if isinstance(web, dict) else {}
+        }
+
+    async def generate_executive_summary(self, summary_content: Dict[str, Any]) -> str:
+        """Generate the executive summary on its own when the batched call did not provide one"""
+        summary_prompt = f"""以下の監視結果のエグゼクティブサマリーを3-5文で日本語で作成してください:
+
+{orjson.dumps(summary_content, option=orjson.OPT_INDENT_2).decode()}
+
+変更があった場合は特に注意を促し、変更がない場合は安定稼働中であることを伝えてください。
+"""
+
+        try:
+            return await self.stream_claude(summary_prompt, max_tokens=512, system=anthropic.NOT_GIVEN)
+        except Exception as e:
+            return f"監視を実行しました。変更検出: {summary_content['has_changes']}"
+
+    def build_rss_content(self, feed_name: str, entries: List[Dict[str, Any]]) -> str:
+        """Build analysis input for RSS feed entries"""
         content = f"RSS Feed: {feed_name}\n\n"
         for i, entry in enumerate(entries[:3], 1):  # Top 3 entries
             content += f"Entry {i}:\n"
@@ -91,13 +177,10 @@ class JapaneseReportGenerator:
             content += f"Summary: {entry.get('summary', 'N/A')}\n"
             content += f"Link: {entry.get('link', 'N/A')}\n\n"
 
-        return self.analyze_with_claude(content, f"RSSフィード（{feed_name}）")
-
-    def generate_webpage_analysis(self, page_name: str, page_data: Dict[str, Any]) -> str:
-        """Generate analysis for web page content"""
-        if "error" in page_data:
-            return f"**エラー:** {page_data['error']}"
+        return content
 
+    def build_webpage_content(self, page_name: str, page_data: Dict[str, Any]) -> str:
+        """Build analysis input for web page content"""
         content = f"Web Page: {page_name}\n"
         content += f"URL: {page_data.get('url', 'N/A')}\n\n"
 
@@ -110,16 +193,32 @@ class JapaneseReportGenerator:
         if "text_preview" in page_data:
             content += f"コンテンツプレビュー:\n{page_data['text_preview']}\n"
 
-        return self.analyze_with_claude(content, f"Webページ（{page_name}）")
+        return content
+
+    async def generate_rss_analysis(self, feed_name: str, entries: List[Dict[str, Any]]) -> str:
+        """Generate analysis for RSS feed entries"""
+        if not entries:
+            return ""
+
+        content = self.build_rss_content(feed_name, entries)
+        return await self.analyze_with_claude(content, f"RSSフィード（{feed_name}）")
+
+    async def generate_webpage_analysis(self, page_name: str, page_data: Dict[str, Any]) -> str:
+        """Generate analysis for web page content"""
+        if "error" in page_data:
+            return f"**エラー:** {page_data['error']}"
+
+        content = self.build_webpage_content(page_name, page_data)
+        return await self.analyze_with_claude(content, f"Webページ（{page_name}）")
 
-    def generate_full_report(self, monitoring_result: Dict[str, Any]) -> str:
+    async def generate_full_report(self, monitoring_result: Dict[str, Any]) -> str:
         """Generate complete Japanese report"""
         current_data = monitoring_result["current_data"]
         changes = monitoring_result["changes"]
 
         timestamp = datetime.fromisoformat(current_data["timestamp"])
 
-        report = f"""# Sysdig ドキュメント監視レポート
+        parts = [f"""# Sysdig ドキュメント監視レポート
 
 **レポート日時:** {timestamp.strftime('%Y年%m月%d日 %H:%M:%S')}
 **変更検出:** {'あり ⚠️' if changes['has_changes'] else 'なし ✓'}
@@ -128,9 +227,29 @@ class JapaneseReportGenerator:
 
 ## エグゼクティブサマリー
 
-"""
+"""]
+
+        # Collect every changed section so Claude analyzes them in one request
+        rss_changes = [
+            feed_name for feed_name in changes.get("rss_changes", {})
+            if feed_name in current_data["rss_feeds"]
+        ]
+        web_changes = [
+            page_name for page_name in changes.get("web_changes", {})
+            if page_name in current_data["web_pages"]
+        ]
+
+        rss_sections = {
+            feed_name: self.build_rss_content(feed_name, current_data["rss_feeds"][feed_name])
+            for feed_name in rss_changes
+            if current_data["rss_feeds"][feed_name]
+        }
+        web_sections = {
+            page_name: self.build_webpage_content(page_name, current_data["web_pages"][page_name])
+            for page_name in web_changes
+            if "error" not in current_data["web_pages"][page_name]
+        }
 
-        # Generate executive summary using Claude
         summary_content = {
             "has_changes": changes["has_changes"],
             "rss_changes_count": len(changes.get("rss_changes", {})),
@@ -139,77 +258,78 @@ class JapaneseReportGenerator:
             "pages": list(current_data["web_pages"].keys())
         }
 
-        summary_prompt = f"""以下の監視結果のエグゼクティブサマリーを3-5文で日本語で作成してください:
-
-{json.dumps(summary_content, indent=2, ensure_ascii=False)}
-
-変更があった場合は特に注意を促し、変更がない場合は安定稼働中であることを伝えてください。
-"""
-
-        try:
-            message = self.client.messages.create(
-                model="claude-sonnet-4-5-20250929",
-                max_tokens=512,
-                temperature=0,
-                messages=[
-                    {"role": "user", "content": summary_prompt}
-                ]
-            )
-            report += message.content[0].text + "\n\n"
-        except Exception as e:
-            report += f"監視を実行しました。変更検出: {changes['has_changes']}\n\n"
-
-        report += "---\n\n"
+        analysis = await self.analyze_batch_with_claude(summary_content, rss_sections, web_sections)
+        rss_analyses = analysis["rss"]
+        web_analyses = analysis["web"]
+
+        # Sections missing from the batched response are analyzed individually, concurrently
+        missing_rss = [feed_name for feed_name in rss_changes if not rss_analyses.get(feed_name)]
+        missing_web = [page_name for page_name in web_changes if not web_analyses.get(page_name)]
+        tasks = [
+            self.generate_rss_analysis(feed_name, current_data["rss_feeds"][feed_name])
+            for feed_name in missing_rss
+        ] + [
+            self.generate_webpage_analysis(page_name, current_data["web_pages"][page_name])
+            for page_name in missing_web
+        ]
+        executive = analysis["executive"]
+        if not executive:
+            tasks.append(self.generate_executive_summary(summary_content))
+        results = await asyncio.gather(*tasks)
+        if not executive:
+            executive = results.pop()
+        rss_analyses.update(zip(missing_rss, results[:len(missing_rss)]))
+        web_analyses.update(zip(missing_web, results[len(missing_rss):]))
+
+        parts.append(executive + "\n\n")
+
+        parts.append("---\n\n")
 
         # Analyze RSS feeds if there are changes
         if changes.get("rss_changes"):
-            report += "## 📡 RSSフィード更新情報\n\n"
+            parts.append("## 📡 RSSフィード更新情報\n\n")
 
-            for feed_name in changes["rss_changes"]:
-                if feed_name in current_data["rss_feeds"]:
-                    entries = current_data["rss_feeds"][feed_name]
-                    report += self.generate_rss_analysis(feed_name, entries)
-                    report += "\n\n"
+            for feed_name in rss_changes:
+                parts.append(rss_analyses[feed_name])
+                parts.append("\n\n")
 
         # Analyze web pages if there are changes
         if changes.get("web_changes"):
-            report += "## 🌐 Webページ更新情報\n\n"
+            parts.append("## 🌐 Webページ更新情報\n\n")
 
-            for page_name in changes["web_changes"]:
-                if page_name in current_data["web_pages"]:
-                    page_data = current_data["web_pages"][page_name]
-                    report += self.generate_webpage_analysis(page_name, page_data)
-                    report += "\n\n"
+            for page_name in web_changes:
+                parts.append(web_analyses[page_name])
+                parts.append("\n\n")
 
         # If no changes, still provide status of monitored sources
         if not changes["has_changes"]:
-            report += "## 📊 監視対象ステータス\n\n"
-            report += "### RSSフィード\n\n"
+            parts.append("## 📊 監視対象ステータス\n\n")
+            parts.append("### RSSフィード\n\n")
 
             for feed_name, entries in current_data["rss_feeds"].items():
                 if entries:
                     latest = entries[0]
-                    report += f"- **{feed_name}**: 最新エントリー「{latest.get('title', 'N/A')}」（{latest.get('published', 'N/A')}）\n"
+                    parts.append(f"- **{feed_name}**: 最新エントリー「{latest.get('title', 'N/A')}」（{latest.get('published', 'N/A')}）\n")
                 else:
-                    report += f"- **{feed_name}**: エントリーなし\n"
+                    parts.append(f"- **{feed_name}**: エントリーなし\n")
 
-            report += "\n### Webページ\n\n"
+            parts.append("\n### Webページ\n\n")
 
             for page_name, page_data in current_data["web_pages"].items():
                 if "error" in page_data:
-                    report += f"- **{page_name}**: エラー（{page_data['error']}）\n"
+                    parts.append(f"- **{page_name}**: エラー（{page_data['error']}）\n")
                 else:
-                    report += f"- **{page_name}**: 正常に取得\n"
+                    parts.append(f"- **{page_name}**: 正常に取得\n")
 
-        report += "\n---\n\n"
-        report += "## 📎 参考リンク\n\n"
-        report += "- [Sysdig Release Notes](https://docs.sysdig.com/en/release-notes/)\n"
-        report += "- [Linux Host Shield Release Notes](https://docs.sysdig.com/en/release-notes/linux-host-shield-release-notes/)\n"
-        report += "- [Deprecation Notice](https://docs.sysdig.com/en/deprecation/)\n"
-        report += "\n---\n\n"
-        report += f"*このレポートは自動生成されました（Claude API使用）*\n"
+        parts.append("\n---\n\n")
+        parts.append("## 📎 参考リンク\n\n")
+        parts.append("- [Sysdig Release Notes](https://docs.sysdig.com/en/release-notes/)\n")
+        parts.append("- [Linux Host Shield Release Notes](https://docs.sysdig.com/en/release-notes/linux-host-shield-release-notes/)\n")
+        parts.append("- [Deprecation Notice](https://docs.sysdig.com/en/deprecation/)\n")
+        parts.append("\n---\n\n")
+        parts.append(f"*このレポートは自動生成されました（Claude API使用）*\n")
 
-        return report
+        return "".join(parts)
 
     def save_report(self, report: str, filename: str = None) -> str:
         """Save report to file"""
@@ -250,8 +370,7 @@ def main():
             }
         }
     else:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            latest_data = json.load(f)
+        latest_data = orjson.loads(data_file.read_bytes())
 
         # Mock up changes structure if not present
         monitoring_result = {
@@ -263,18 +382,24 @@ def main():
             }
         }
 
-        # Check for changes file
-        changes_files = sorted(Path("data").glob("changes_*.json"))
-        if changes_files:
-            latest_changes = changes_files[-1]
-            with open(latest_changes, 'r', encoding='utf-8') as f:
-                changes_data = json.load(f)
-                monitoring_result["changes"] = changes_data.get("changes", monitoring_result["changes"])
+        # Check the history log, falling back to changes files written before it existed
+        changes_data = read_last_history_record(Path("data") / HISTORY_FILENAME)
+        if not changes_data:
+            # Names embed a sortable timestamp, so the newest is the max name
+            with os.scandir("data") as it:
+                latest_name = max(
+                    (e.name for e in it if e.name.startswith("changes_") and e.name.endswith(".json")),
+                    default=None
+                )
+            if latest_name:
+                changes_data = orjson.loads((Path("data") / latest_name).read_bytes())
+
+        monitoring_result["changes"] = changes_data.get("changes", monitoring_result["changes"])
 
     # Generate report
     try:
         generator = JapaneseReportGenerator()
-        report = generator.generate_full_report(monitoring_result)
+        report = asyncio.run(generator.generate_full_report(monitoring_result))
         filepath = generator.save_report(report)
         print(f"\n✓ Japanese report generated successfully: {filepath}")
 
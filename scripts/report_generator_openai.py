@@ -6,10 +6,11 @@ Analyzes Sysdig documentation changes and generates customer-ready reports in Ja
 
 import openai
 import os
-import json
+import orjson
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Any
+from monitor import HISTORY_FILENAME, read_last_history_record
 
 class JapaneseReportGenerator:
     def __init__(self, api_key: str = None, reports_dir: str = "reports"):
@@ -119,7 +120,7 @@ class JapaneseReportGenerator:
 
         timestamp = datetime.fromisoformat(current_data["timestamp"])
 
-        report = f"""# Sysdig ドキュメント監視レポート
+        parts = [f"""# Sysdig ドキュメント監視レポート
 
 **レポート日時:** {timestamp.strftime('%Y年%m月%d日 %H:%M:%S')}
 **変更検出:** {'あり ⚠️' if changes['has_changes'] else 'なし ✓'}
@@ -128,7 +129,7 @@ class JapaneseReportGenerator:
 
 ## エグゼクティブサマリー
 
-"""
+"""]
 
         # Generate executive summary using GPT-4
         summary_content = {
@@ -141,7 +142,7 @@ class JapaneseReportGenerator:
 
         summary_prompt = f"""以下の監視結果のエグゼクティブサマリーを3-5文で日本語で作成してください:
 
-{json.dumps(summary_content, indent=2, ensure_ascii=False)}
+{orjson.dumps(summary_content, option=orjson.OPT_INDENT_2).decode()}
 
 変更があった場合は特に注意を促し、変更がない場合は安定稼働中であることを伝えてください。
 """
@@ -155,61 +156,61 @@ class JapaneseReportGenerator:
                 max_tokens=512,
                 temperature=0
             )
-            report += response.choices[0].message.content + "\n\n"
+            parts.append(response.choices[0].message.content + "\n\n")
         except Exception as e:
-            report += f"監視を実行しました。変更検出: {changes['has_changes']}\n\n"
+            parts.append(f"監視を実行しました。変更検出: {changes['has_changes']}\n\n")
 
-        report += "---\n\n"
+        parts.append("---\n\n")
 
         # Analyze RSS feeds if there are changes
         if changes.get("rss_changes"):
-            report += "## 📡 RSSフィード更新情報\n\n"
+            parts.append("## 📡 RSSフィード更新情報\n\n")
 
             for feed_name in changes["rss_changes"]:
                 if feed_name in current_data["rss_feeds"]:
                     entries = current_data["rss_feeds"][feed_name]
-                    report += self.generate_rss_analysis(feed_name, entries)
-                    report += "\n\n"
+                    parts.append(self.generate_rss_analysis(feed_name, entries))
+                    parts.append("\n\n")
 
         # Analyze web pages if there are changes
         if changes.get("web_changes"):
-            report += "## 🌐 Webページ更新情報\n\n"
+            parts.append("## 🌐 Webページ更新情報\n\n")
 
             for page_name in changes["web_changes"]:
                 if page_name in current_data["web_pages"]:
                     page_data = current_data["web_pages"][page_name]
-                    report += self.generate_webpage_analysis(page_name, page_data)
-                    report += "\n\n"
+                    parts.append(self.generate_webpage_analysis(page_name, page_data))
+                    parts.append("\n\n")
 
         # If no changes, still provide status of monitored sources
         if not changes["has_changes"]:
-            report += "## 📊 監視対象ステータス\n\n"
-            report += "### RSSフィード\n\n"
+            parts.append("## 📊 監視対象ステータス\n\n")
+            parts.append("### RSSフィード\n\n")
 
             for feed_name, entries in current_data["rss_feeds"].items():
                 if entries:
                     latest = entries[0]
-                    report += f"- **{feed_name}**: 最新エントリー「{latest.get('title', 'N/A')}」（{latest.get('published', 'N/A')}）\n"
+                    parts.append(f"- **{feed_name}**: 最新エントリー「{latest.get('title', 'N/A')}」（{latest.get('published', 'N/A')}）\n")
                 else:
-                    report += f"- **{feed_name}**: エントリーなし\n"
+                    parts.append(f"- **{feed_name}**: エントリーなし\n")
 
-            report += "\n### Webページ\n\n"
+            parts.append("\n### Webページ\n\n")
 
             for page_name, page_data in current_data["web_pages"].items():
                 if "error" in page_data:
-                    report += f"- **{page_name}**: エラー（{page_data['error']}）\n"
+                    parts.append(f"- **{page_name}**: エラー（{page_data['error']}）\n")
                 else:
-                    report += f"- **{page_name}**: 正常に取得\n"
+                    parts.append(f"- **{page_name}**: 正常に取得\n")
 
-        report += "\n---\n\n"
-        report += "## 📎 参考リンク\n\n"
-        report += "- [Sysdig Release Notes](https://docs.sysdig.com/en/release-notes/)\n"
-        report += "- [Linux Host Shield Release Notes](https://docs.sysdig.com/en/release-notes/linux-host-shield-release-notes/)\n"
-        report += "- [Deprecation Notice](https://docs.sysdig.com/en/deprecation/)\n"
-        report += "\n---\n\n"
-        report += f"*このレポートは自動生成されました（OpenAI GPT-4使用）*\n"
+        parts.append("\n---\n\n")
+        parts.append("## 📎 参考リンク\n\n")
+        parts.append("- [Sysdig Release Notes](https://docs.sysdig.com/en/release-notes/)\n")
+        parts.append("- [Linux Host Shield Release Notes](https://docs.sysdig.com/en/release-notes/linux-host-shield-release-notes/)\n")
+        parts.append("- [Deprecation Notice](https://docs.sysdig.com/en/deprecation/)\n")
+        parts.append("\n---\n\n")
+        parts.append(f"*このレポートは自動生成されました（OpenAI GPT-4使用）*\n")
 
-        return report
+        return "".join(parts)
 
     def save_report(self, report: str, filename: str = None) -> str:
         """Save report to file"""
@@ -250,8 +251,7 @@ def main():
             }
         }
     else:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            latest_data = json.load(f)
+        latest_data = orjson.loads(data_file.read_bytes())
 
         # Mock up changes structure if not present
         monitoring_result = {
@@ -263,13 +263,19 @@ def main():
             }
         }
 
-        # Check for changes file
-        changes_files = sorted(Path("data").glob("changes_*.json"))
-        if changes_files:
-            latest_changes = changes_files[-1]
-            with open(latest_changes, 'r', encoding='utf-8') as f:
-                changes_data = json.load(f)
-                monitoring_result["changes"] = changes_data.get("changes", monitoring_result["changes"])
+        # Check the history log, falling back to changes files written before it existed
+        changes_data = read_last_history_record(Path("data") / HISTORY_FILENAME)
+        if not changes_data:
+            # Names embed a sortable timestamp, so the newest is the max name
+            with os.scandir("data") as it:
+                latest_name = max(
+                    (e.name for e in it if e.name.startswith("changes_") and e.name.endswith(".json")),
+                    default=None
+                )
+            if latest_name:
+                changes_data = orjson.loads((Path("data") / latest_name).read_bytes())
+
+        monitoring_result["changes"] = changes_data.get("changes", monitoring_result["changes"])
 
     # Generate report
     try: